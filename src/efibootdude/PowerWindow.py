@@ -335,6 +335,24 @@ class Window:
                 ns.texts.append(text)  # text only history
                 ns.row_cnt += 1
 
+    def put_body_at(self, row, text, attr=None):
+        """Overwrite one existing body row in place (lets callers patch
+        just the damaged rows rather than clear/rebuild everything)."""
+        ns = self.body
+        if not 0 <= row < ns.rows:
+            return
+        if attr is None:
+            attr = curses.A_NORMAL
+        width = self.get_pad_width()
+        try:
+            ns.pad.addstr(row, 0, text[0:width].ljust(width), attr)
+        except curses.error:
+            pass # last-cell writes can fail; harmless (see draw())
+        while row >= len(ns.texts):
+            ns.texts.append('')
+        ns.texts[row] = text
+        ns.row_cnt = max(ns.row_cnt, row+1)
+
     def add_header(self, text, attr=None, resume=False):
         """Add text to header"""
         self._add(self.head, text, attr, resume)
@@ -13,53 +13,134 @@ Interactive, visual thin layer atop efibootmgr
 import os
 import sys
 import re
+import shlex
 import shutil
+import termios
 from types import SimpleNamespace
 import subprocess
 import traceback
 import curses as cs
 import argparse
-# import xml.etree.ElementTree as ET
 from efibootdude.PowerWindow import Window, OptionSpinner
 
+# pre-compiled patterns (avoid per-call compile/cache-lookup in the redraw loop)
+_UUID_RE = re.compile(r'\b[0-9A-F]{8}-[0-9A-F]{4}-[0-9A-F]{4}'
+                      + r'-[0-9A-F]{4}-[0-9A-F]{12}\b', re.IGNORECASE)
+_BOOT_LINE_RE = re.compile(r'^Boot([0-9a-f]+)(\*?)' # Boot0024*
+                           + r'[ \t]+([^\t]+?)[ \t]*\t' # Linux Boot Manager
+                           + r'[ \t]*(.*?)[ \t]*$', # HD(4,GPT,cd15e3b1-...
+                           re.IGNORECASE)
+_SUBPATH_RE = re.compile(r'(?:/?\b\w*\(|/)(\\[^/()]+)(?:$|[()/])', re.IGNORECASE)
+_CLEAN_RE = re.compile(r'(?P<fv>FvVol\([^)]+\)/FvFile\([^)]+\))'
+                       + r'|(?P<pci>PciRoot\([^{]+)'
+                       + r'|(?P<vhw>/?VenHw\(.*$)'
+                       + r'|(?P<vmsg>/?VenMsg\(.*$)'
+                       + r'|(?P<auto>\{auto_created_boot_option\})', re.IGNORECASE)
+_FAST_UUID = True # use the hand-rolled uuid scanner (False = regex fallback)
+_HEX_BYTES = b'0123456789abcdefABCDEF'
+# hot-path key sets, built once (do_key and __init__ share them)
+_ENTER_KEYS = frozenset({cs.KEY_ENTER, 10})
+_OTHER_KEYS = (frozenset(map(ord, 'btudrnmw*zqx'))
+               | _ENTER_KEYS | frozenset({27})) # 27 = ESCAPE
+
+def _clean_sub(mat):
+    """ Replacement dispatch for _CLEAN_RE (one scan covers all cases). """
+    if mat.group('fv'):
+        return '[Firmware]'
+    if mat.group('auto'):
+        return '[Auto]'
+    return ''
+
+
+class BootDigest:
+    """ One digested line of 'efibootmgr' output; slotted so the many
+        per-entry attribute reads in the render loop stay cheap. """
+    __slots__ = ('ident', 'is_boot', 'active', 'label',
+                 'info1', 'info2', 'clean1', 'clean2', 'line_cache')
+
+    def __init__(self, ident=None, is_boot=False, active='', label='',
+                 info1='', info2='', clean1='', clean2=''):
+        self.ident = ident
+        self.is_boot = is_boot
+        self.active = active
+        self.label = label
+        self.info1 = info1
+        self.info2 = info2
+        self.clean1 = clean1
+        self.clean2 = clean2
+        self.line_cache = None # (render-state key, formatted line)
+
 
 class EfiBootDude:
     """ Main class for curses atop efibootmgr"""
     singleton = None
+    _EFI_PREFIX = ('sudo', 'efibootmgr', '--quiet')
+    # FIXME: keys
+    _HELP_LINES = (
+        '   q or x - quit program (CTL-C disabled)',
+        '   u - up - move boot entry up',
+        '   d - down - move boot entry down',
+#       '   c - copy - copy boot entry',
+        '   r - remove - remove boot',
+#       '   a - add - add boot entry',
+        '   n - next - set next boot default',
+        '   t - tag - set a new label for the boot entry',
+        '   * - toggle whether entry is active',
+        '   m - modify - modify the value',
+        '   w - write - write the changes',
+        '   ESC - abandon changes and re-read boot state',
+        '   b - reboot the machine',
+    )
 
     def __init__(self, testfile=None):
         # self.cmd_loop = CmdLoop(db=False) # just running as command
         assert not EfiBootDude.singleton
         EfiBootDude.singleton = self
         self.testfile = testfile
+        try: # captured while the tty is still sane (pre-curses)
+            self._saved_termios = termios.tcgetattr(sys.stdin.fileno())
+        except (termios.error, OSError, ValueError):
+            self._saved_termios = None
 
         spin = self.spin = OptionSpinner()
         spin.add_key('help_mode', '? - toggle help screen', vals=[False, True])
         spin.add_key('verbose', 'v - toggle verbose', vals=[False, True])
 
-        # FIXME: keys
-        other = 'btudrnmw*zqx'
-        other_keys = set(ord(x) for x in other)
-        other_keys.add(cs.KEY_ENTER)
-        other_keys.add(27) # ESCAPE
-        other_keys.add(10) # another form of ENTER
         self.opts = spin.default_obj
 
         self.actions = {} # currently available actions
+        self._dispatch = { # O(1) key dispatch for do_key
+            cs.KEY_ENTER: self._on_enter, 10: self._on_enter,
+            ord('q'): self._on_quit, ord('x'): self._on_quit,
+            ord('m'): self._on_modify,
+            ord('u'): self._on_up, ord('d'): self._on_down,
+            ord('r'): self._on_remove, ord('n'): self._on_next,
+            ord('*'): self._on_toggle, ord('t'): self._on_tag,
+            27: self._on_esc, # ESCAPE
+            ord('w'): self._on_write, ord('b'): self._on_boot,
+        }
         self.check_preqreqs()
         self.mounts, self.uuids = {}, {}
+        self._mounts_key = None
+        self._partuuid_key, self._uuids_cache = None, None
         self.mods = SimpleNamespace()
         self.digests, self.width1, self.label_wid, self.boot_idx = [], 0, 0, 0
+        self._digest_hash, self._reuse_ok = None, False
+        self.ui_dirty = True # whether the screen needs a rebuild
+        self._dirty_rows = None # rows needing repaint (None=all of them)
         self.win = None
         self.reinit()
         self.win = Window(head_line=True, body_rows=len(self.digests)+20, head_rows=10,
-                          keys=spin.keys ^ other_keys, mod_pick=self.mod_pick)
+                          keys=spin.keys ^ _OTHER_KEYS, mod_pick=self.mod_pick)
         self.win.pick_pos = self.boot_idx
 
     def reinit(self):
         """ RESET EVERYTHING"""
-        self.mounts = self.get_mounts()
-        self.uuids = self.get_part_uuids() # uuid in lower case
+        # a clean session means the digests still match the as-read
+        # state, so identical efibootmgr output can be kept as-is
+        self._reuse_ok = bool(self.win) and not getattr(self.mods, 'dirty', True)
+        self.refresh_system_info()
+        self._kl_cache = (None, None) # memo for mod_pick: key, (actions, words)
         self.mods = SimpleNamespace(
                     dirty=False, # if anything changed
                     order=False,
@@ -71,140 +152,233 @@ class EfiBootDude:
                     actives=set(),
                     inactives=set(),
                     )
-        self.digests, self.width1, self.label_wid, self.boot_idx = [], 0, 0, 0
         self.digest_boots()
         if self.win:
             self.win.pick_pos = self.boot_idx
 
+    def refresh_system_info(self):
+        """ Re-read mounts and partition uuids, but only when their
+            sources appear changed (they rarely do mid-session). """
+        try:
+            st = os.stat('/proc/mounts')
+            stat_key = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            stat_key = None
+        if stat_key is None or stat_key != self._mounts_key or not self.mounts:
+            self.mounts = self.get_mounts()
+            self._mounts_key = stat_key
+            self._partuuid_key = None # uuid values derive from mounts
+        uuids = self.get_part_uuids() # uuid in lower case
+        if uuids is not self.uuids:
+            # digests embed mount/uuid lookups, so unchanged efibootmgr
+            # output must still be re-digested after a rebuild
+            self._digest_hash = None
+        self.uuids = uuids
+
     @staticmethod
     def get_mounts():
         """ Get a dictionary of device-to-mount-point """
         mounts = {}
-        with open('/proc/mounts', 'r', encoding='utf-8') as mounts_file:
+        with open('/proc/mounts', encoding='utf-8',
+                  errors='surrogateescape', buffering=65536) as mounts_file:
             for line in mounts_file:
-                parts = line.split()
-                dev = parts[0]
-                mount_point = parts[1]
-                mounts[dev] = mount_point
+                if line[0] != '/': # skips proc, sysfs, tmpfs, ... unsplit
+                    continue
+                parts = line.split(' ', 2)
+                if len(parts) >= 2:
+                    mounts[parts[0]] = parts[1]
         return mounts
 
     def get_part_uuids(self):
-        """ Get all the Partition UUIDS"""
+        """ Get all the Partition UUIDS (memoized by directory mtime since
+            partitions virtually never change mid-session). """
         uuids = {}
         partuuid_path = '/dev/disk/by-partuuid/'
 
-        if not os.path.exists(partuuid_path):
+        try:
+            st = os.stat(partuuid_path)
+            stat_key = (st.st_mtime_ns, st.st_size)
+        except OSError:
             return uuids
-        for entry in os.listdir(partuuid_path):
-            full_path = os.path.join(partuuid_path, entry)
-            if os.path.islink(full_path):
-                device_path = os.path.realpath(full_path)
-                uuids[entry] = device_path
-                if device_path in self.mounts:
-                    uuids[entry] = self.mounts[device_path]
+        if stat_key == self._partuuid_key and self._uuids_cache is not None:
+            return self._uuids_cache
+        with os.scandir(partuuid_path) as entries:
+            for entry in entries:
+                if not entry.is_symlink():
+                    continue
+                # readlink+normpath rather than realpath (which stat-walks)
+                device_path = os.readlink(entry.path)
+                if not device_path.startswith('/'):
+                    device_path = os.path.normpath(
+                        os.path.join(partuuid_path, device_path))
+                uuids[entry.name] = self.mounts.get(device_path, device_path)
+        self._partuuid_key, self._uuids_cache = stat_key, uuids
         return uuids
 
     @staticmethod
     def extract_uuids(line):
-        """ Find uuid string in a line """
-        # Define the regex pattern for UUID (e.g., 25d2dea1-9f68-1644-91dd-4836c0b3a30a)
-        pattern = r'\b[0-9A-F]{8}-[0-9A-F]{4}-[0-9A-F]{4}-[0-9A-F]{4}-[0-9A-F]{12}\b'
-        mats = re.findall(pattern, line, re.IGNORECASE)
-        return mats
+        """ Lazily find uuid strings in a line; the digest loop stops at
+            the first one it can map, so don't build the full list. """
+        # e.g., 25d2dea1-9f68-1644-91dd-4836c0b3a30a
+        if not _FAST_UUID:
+            for mat in _UUID_RE.finditer(line):
+                yield mat.group(0)
+            return
+        if '-' not in line: # cheap pre-filter
+            return
+        idx, last = 0, len(line) - 36
+        while idx <= last:
+            if (line[idx+8] == '-' and line[idx+13] == '-'
+                    and line[idx+18] == '-' and line[idx+23] == '-'):
+                cand = line[idx:idx+36]
+                hexes = cand[:8] + cand[9:13] + cand[14:18] + cand[19:23] + cand[24:]
+                # deleting the hex chars must consume the whole chunk
+                if not hexes.encode().translate(None, _HEX_BYTES):
+                    yield cand
+                    idx += 36
+                    continue
+            idx += 1
 
     def digest_boots(self):
         """ Digest the output of 'efibootmgr'."""
         # Define the command to run
-        lines = []
         if self.testfile:
             # if given a "testfile" (which should be just the
             # raw output of 'efibootmgr'), then parse it
-            with open(self.testfile, 'r', encoding='utf-8') as fh:
-                lines = fh.readlines()
-        else: # run efibootmgr
-            command = 'efibootmgr'.split()
-            result = subprocess.run(command, stdout=subprocess.PIPE, text=True, check=True)
-            lines = result.stdout.splitlines()
-        rv = []
+            with open(self.testfile, 'r', encoding='utf-8') as stream:
+                raw = stream.read()
+        else:
+            proc = subprocess.run(['efibootmgr'], stdout=subprocess.PIPE,
+                                  text=True, check=False)
+            if proc.returncode != 0:
+                print(f'WARNING: efibootmgr exited {proc.returncode}'
+                      + ' (output may be incomplete)', file=sys.stderr)
+            raw = proc.stdout
+        # identical output and no abandoned edits: keep what we have
+        # (the output is tiny, so buffering it for the hash beats
+        # re-running the whole parse)
+        digest_hash = hash(raw)
+        if (digest_hash == self._digest_hash and self._reuse_ok
+                and self.digests):
+            return self.digests
+        self._digest_hash = digest_hash
+        # seed with a placeholder BootNext that a real one may replace
+        rv = [BootDigest(ident='BootNext:', label='---')]
+        # direct references spare the handlers a scan of the digests
+        self._bootnext_entry = rv[0]
+        self._timeout_entry = None
         width1 = 0  # width of info1
         label_wid = 0
         boots = {}
-        for line in ['BootNext: ---'] + lines:
-            parts = line.split(maxsplit=1)
-            if len(parts) < 2:
+        boot_order = '' # output may lack a BootOrder: line
+        # hoist the per-line lookups out of the parse loop
+        _boot_match = _BOOT_LINE_RE.match
+        _subpath_search = _SUBPATH_RE.search
+        _extract, _intern = self.extract_uuids, sys.intern
+        _uuids_get, _clean = self.uuids.get, self._clean
+        for line in raw.splitlines():
+            key, sep, info = line.partition(' ')
+            if not sep:
                 continue
-            key, info = parts[0], parts[1]
 
             if key == 'BootOrder:':
                 boot_order = info
                 continue
 
-            ns = SimpleNamespace(
-                ident=None,
-                is_boot=False,
-                active='',
-                label='',
-                info1='',
-                info2='',
-            )
-
-            mat = re.match(r'\bBoot([0-9a-f]+)\b(\*?)' # Boot0024*
-                           + r'\s+(\S.*\S|\S)\s*\t' # Linux Boot Manager
-                           + r'\s*(\S.*\S|\S)\s*$', # HD(4,GPT,cd15e3b1-...
-                           line, re.IGNORECASE)
+            ns = BootDigest()
+
+            # one anchored single-pass match yields all four fields; the
+            # cheap prefix test spares non-boot lines the regex altogether
+            mat = None
+            if (len(key) > 4 and key.startswith('Boot')
+                    and key[4] in '0123456789abcdefABCDEF'):
+                mat = _boot_match(line)
             if not mat:
                 ns.ident = key
                 ns.label = info
+                _clean(ns)
                 if key == 'BootNext:' and len(rv) > 0:
                     rv[0] = ns
+                    self._bootnext_entry = ns
                 else:
                     rv.append(ns)
+                    if key == 'Timeout:':
+                        self._timeout_entry = ns
                 continue
 
-            ns.ident = mat.group(1)
+            ns.ident = _intern(mat.group(1)) # short hex keys, much compared
             ns.is_boot = True
             ns.active = mat.group(2)
             ns.label = mat.group(3)
-            label_wid = max(label_wid, len(ns.label))
+            wid = len(ns.label)
+            if wid > label_wid:
+                label_wid = wid
             other = mat.group(4)
 
-            pat = r'(?:/?\b\w*\(|/)(\\[^/()]+)(?:$|[()/])'
-            mat = re.search(pat, other, re.IGNORECASE)
+            mat = _subpath_search(other)
             device, subpath = '', '' # e.g., /boot/efi, \EFI\UBUNTU\SHIMX64.EFI
             if mat:
                 subpath = mat.group(1) + ' '
                 start, end = mat.span()
                 other = other[:start] + other[end:]
 
-            uuids = self.extract_uuids(other)
-            for uuid in uuids:
-                if uuid and uuid in self.uuids:
-                    device = self.uuids[uuid]
+            # lowercase once per line; uuids keys are already lower
+            for uuid in _extract(other.lower()):
+                device = _uuids_get(uuid, '')
+                if device:
                     break
 
             if device:
                 ns.info1 = device
                 ns.info2 = subpath if subpath else other
-                width1 = max(width1, len(ns.info1))
+                wid = len(device)
+                if wid > width1:
+                    width1 = wid
             elif subpath:
                 ns.info1 = subpath
                 ns.info2 = other
             else:
                 ns.info1 = other
+            _clean(ns)
             boots[ns.ident] = ns
 
         self.boot_idx = len(rv)
         self.width1 = width1
         self.label_wid = label_wid
 
-        for ident in boot_order.split(','):
-            if ident in boots:
-                rv.append(boots.pop(ident))
-        rv += list(boots.values())
+        order_ids = boot_order.split(',')
+        order_set = set(order_ids)
+        rv.extend(boots[ident] for ident in order_ids if ident in boots)
+        rv.extend(ns for ident, ns in boots.items()
+                  if ident not in order_set)
 
         self.digests = rv
+        # kept in sync by the up/down/remove handlers so write() need
+        # not rescan the digests
+        self._boot_idents = [ns.ident for ns in rv if ns.is_boot]
+        # cheap snapshots of the as-read state for "did it really change?"
+        self._orig_order = tuple(self._boot_idents)
+        self._orig_actives = frozenset(
+            ns.ident for ns in rv if ns.is_boot and ns.active)
         return rv
 
+    @staticmethod
+    def _clean(ns):
+        """ Cache the terse (non-verbose) forms of the info fields;
+            computed once per digest rather than on every redraw. """
+        ns.clean1 = EfiBootDude._scrub(ns.info1)
+        ns.clean2 = EfiBootDude._scrub(ns.info2)
+
+    @staticmethod
+    def _scrub(text):
+        """ Produce the terse form of one info field; the cheap substring
+            tests avoid firing up the regex engine on the common case. """
+        if ('FvVol(' in text or 'PciRoot(' in text
+                or 'VenHw(' in text or 'VenMsg(' in text
+                or '{auto_created_boot_option}' in text):
+            text = _CLEAN_RE.sub(_clean_sub, text)
+        return text
+
     @staticmethod
     def check_preqreqs():
         """ Check that needed programs are installed. """
@@ -222,13 +396,25 @@ class EfiBootDude:
         words = line.split(maxsplit=1)
         return words[0]
 
+    def clear_sane(self):
+        """ Clear the screen and restore sane tty modes without
+            forking a shell for 'clear; stty sane'. """
+        sys.stdout.write('\x1b[H\x1b[2J')
+        sys.stdout.flush()
+        if self._saved_termios:
+            termios.tcsetattr(sys.stdin.fileno(),
+                              termios.TCSADRAIN, self._saved_termios)
+
     def reboot(self):
         """ Reboot the machine """
         Window.stop_curses()
-        os.system('clear; stty sane; (set -x; sudo reboot now)')
+        self.clear_sane()
+        cmd = ['sudo', 'reboot', 'now']
+        print('+ ' + shlex.join(cmd))
+        subprocess.run(cmd, check=False)
 
         # NOTE: probably will not get here...
-        os.system(r'/bin/echo -e "\n\n===== Press ENTER for menu ====> \c"; read FOO')
+        input('\n\n===== Press ENTER for menu ====> ')
         self.reinit()
         Window._start_curses()
         self.win.pick_pos = self.boot_idx
@@ -237,38 +423,46 @@ class EfiBootDude:
         """ Commit the changes. """
         if not self.mods.dirty:
             return
-        cmds = []
-        prefix = 'sudo efibootmgr --quiet'
+        cmds = [] # argv lists (no shell, so labels cannot inject)
+        prefix = list(self._EFI_PREFIX)
         for ident in self.mods.removes:
-            cmds.append(f'{prefix} --delete-bootnum --bootnum {ident}')
+            cmds.append(prefix + ['--delete-bootnum', '--bootnum', ident])
+        # one invocation per touched bootnum (active toggle and/or retag)
+        per_boot = {}
         for ident in self.mods.actives:
-            cmds.append(f'{prefix} --active --bootnum {ident}')
+            per_boot.setdefault(ident, []).append('--active')
         for ident in self.mods.inactives:
-            cmds.append(f'{prefix} --inactive --bootnum {ident}')
+            per_boot.setdefault(ident, []).append('--inactive')
         for ident, tag in self.mods.tags.items():
-            cmds.append(f'{prefix} --bootnum {ident} --label "{tag}"')
+            per_boot.setdefault(ident, []).extend(['--label', tag])
+        for ident, flags in per_boot.items():
+            cmds.append(prefix + ['--bootnum', ident] + flags)
+        # the global settings all fit in one invocation
+        settings = []
         if self.mods.order:
-            orders = [ns.ident for ns in self.digests if ns.is_boot]
-            orders = ','.join(orders)
-            cmds.append(f'{prefix} --bootorder {orders}')
+            settings += ['--bootorder', ','.join(self._boot_idents)]
         if self.mods.next:
-            cmds.append(f'{prefix} --bootnext {self.mods.next}')
+            settings += ['--bootnext', self.mods.next]
         if self.mods.timeout:
-            cmds.append(f'{prefix} --timeout {self.mods.timeout}')
+            settings += ['--timeout', self.mods.timeout]
+        if settings:
+            cmds.append(prefix + settings)
         Window.stop_curses()
-        os.system('clear; stty sane')
+        self.clear_sane()
         print('Commands:')
         for cmd in cmds:
-            print(f' + {cmd}')
+            print(' + ' + shlex.join(cmd))
         yes = input("Run the above commands? (yes/No) ")
 
         if yes.lower().startswith('y'):
-            os.system('/bin/echo; /bin/echo')
-
+            print('\n')
             for cmd in cmds:
-                os.system(f'(set -x; {cmd}); /bin/echo "    <<<ExitCode=$?>>>"')
-
-            os.system(r'/bin/echo -e "\n\n===== Press ENTER for menu ====> \c"; read FOO')
+                print('+ ' + shlex.join(cmd))
+                rcode = subprocess.run(cmd, check=False).returncode
+                print(f'    <<<ExitCode={rcode}>>>')
+            print()
+            input("===== Press ENTER for menu ====> ")
+            self._digest_hash = None # NVRAM changed; force a re-parse
             self.reinit()
 
         Window._start_curses()
@@ -279,62 +473,65 @@ class EfiBootDude:
 
         self.opts.name = "[hit 'n' to enter name]"
         while True:
+            if not self.ui_dirty:
+                # nothing changed (e.g., idle timeout): keep the screen
+                rows, cols = self.win.rows, self.win.cols
+                key = self.win.prompt(seconds=300)
+                _ = self.do_key(key)
+                if key or (rows, cols) != (self.win.rows, self.win.cols):
+                    self.ui_dirty = True
+                continue
+            if self._dirty_rows and not self.opts.help_mode:
+                # only specific rows were damaged: patch them in place
+                cache_key = (self.opts.verbose, self.label_wid, self.width1)
+                for row in self._dirty_rows:
+                    if 0 <= row < len(self.digests):
+                        self.win.put_body_at(row,
+                            self._format_row(self.digests[row], cache_key))
+                self._dirty_rows, self.ui_dirty = None, False
+                self.win.last_pick_pos = -1 # force highlight repaint
+                self.win.render()
+                continue
+            self.win.clear()
+            self._dirty_rows, self.ui_dirty = None, False
             if self.opts.help_mode:
                 self.win.set_pick_mode(False)
                 self.spin.show_help_nav_keys(self.win)
                 self.spin.show_help_body(self.win)
-                # FIXME: keys
-                lines = [
-                    '   q or x - quit program (CTL-C disabled)',
-                    '   u - up - move boot entry up',
-                    '   d - down - move boot entry down',
-#                   '   c - copy - copy boot entry',
-                    '   r - remove - remove boot',
-#                   '   a - add - add boot entry',
-                    '   n - next - set next boot default',
-                    '   t - tag - set a new label for the boot entry',
-                    '   * - toggle whether entry is active'
-                    '   m - modify - modify the value'
-                    '   w - write - write the changes',
-                    '   ESC - abandon changes and re-read boot state',
-                    '   b - reboot the machine',
-                ]
-                for line in lines:
+                for line in self._HELP_LINES:
                     self.win.put_body(line)
             else:
                 # self.win.set_pick_mode(self.opts.pick_mode, self.opts.pick_size)
                 self.win.set_pick_mode(True)
                 self.win.add_header(self.get_keys_line(), attr=cs.A_BOLD)
+                cache_key = (self.opts.verbose, self.label_wid, self.width1)
+                add_body, format_row = self.win.add_body, self._format_row
                 for ns in self.digests:
-                    info1 = ns.info1
-                    if not self.opts.verbose:
-                        mat = re.search(r'/?VenHw\(.*$', info1, re.IGNORECASE)
-                        if mat:
-                            start, end = mat.span()
-                            info1 = info1[:start] + info1[end:]
-
-                    line = f'{ns.active:>1} {ns.ident:>4} {ns.label:<{self.label_wid}}'
-                    line += f' {info1:<{self.width1}} {ns.info2}'
-                    self.win.add_body(line)
+                    add_body(format_row(ns, cache_key))
             self.win.render()
 
-            _ = self.do_key(self.win.prompt(seconds=300))
-            self.win.clear()
+    def _format_row(self, ns, cache_key):
+        """ Format (or reuse) the display row for one digest entry. """
+        cached = ns.line_cache
+        if cached and cached[0] == cache_key:
+            return cached[1]
+        info1 = ns.info1 if self.opts.verbose else ns.clean1
+        info2 = ns.info2 if self.opts.verbose else ns.clean2
+        # C-level ljust/rjust; no per-row format-spec parsing
+        line = (ns.active.rjust(1) + ' ' + ns.ident.rjust(4) + ' '
+                + ns.label.ljust(self.label_wid) + ' '
+                + info1.ljust(self.width1) + ' ' + info2)
+        ns.line_cache = (cache_key, line)
+        return line
 
     def get_keys_line(self):
         """ TBD """
         # EXPAND
-        line = ''
-        for key, verb in self.actions.items():
-            if key[0] == verb[0]:
-                line += f' {verb}'
-            else:
-                line += f' {key}:{verb}'
-        # or EXPAND
-        line += ' ?:help quit'
-        # for action in self.actions:
-            # line += f' {action[0]}:{action}'
-        return line[1:]
+        words = [verb if key[0] == verb[0] else f'{key}:{verb}'
+                 for key, verb in self.actions.items()]
+        words.append('?:help')
+        words.append('quit')
+        return ' '.join(words)
 
     def get_actions(self):
         """ Determine the type of the current line and available commands."""
@@ -369,110 +566,177 @@ class EfiBootDude:
             We use it to alter the state
         """
         this = EfiBootDude.singleton
-        this.actions = this.get_actions()
-        header = this.get_keys_line()
-        wds = header.split()
+        wid = this.win.get_pad_width()
+        pos = this.win.pick_pos
+        # the active state matters: it flips the act/inact action word
+        # even when pos and dirty are unchanged (e.g. re-toggling with
+        # other edits still pending)
+        active = (this.digests[pos].active
+                  if 0 <= pos < len(this.digests) else None)
+        # the list length matters too: removing a row can slide a
+        # look-alike entry into pos while up/down availability changed
+        key = (pos, len(this.digests), this.mods.dirty, active, wid)
+        if key == this._kl_cache[0]:
+            this.actions, header, offsets = this._kl_cache[1]
+        else:
+            this.actions = this.get_actions()
+            wds = this.get_keys_line().split()
+            offsets, col = [], 0 # word starts, for the key highlights
+            for wd in wds:
+                offsets.append(col)
+                col += len(wd) + 1
+            header = ' '.join(wds).ljust(wid)
+            this._kl_cache = (key, (this.actions, header, offsets))
+        # one addstr for the whole line, then one chgat per key letter
+        # (was two add_header calls per word)
         this.win.head.pad.move(0, 0)
-        for wd in wds:
-            if wd:
-                this.win.add_header(wd[0], attr=cs.A_BOLD|cs.A_UNDERLINE, resume=True)
-            if wd[1:]:
-                this.win.add_header(wd[1:] + ' ', resume=True)
-
-        _, col = this.win.head.pad.getyx()
-        pad = ' ' * (this.win.get_pad_width()-col)
-        this.win.add_header(pad, resume=True)
+        this.win.add_header(header, resume=True)
+        pad = this.win.head.pad
+        for col in offsets:
+            if col < wid:
+                pad.chgat(0, col, 1, cs.A_BOLD | cs.A_UNDERLINE)
         return line
 
     def do_key(self, key):
         """ TBD """
         if not key:
             return True
-        if key == cs.KEY_ENTER or key == 10: # Handle ENTER
-            if self.opts.help_mode:
-                self.opts.help_mode = False
-                return True
-            return None
-
         if key in self.spin.keys:
             value = self.spin.do_key(key, self.win)
             return value
 
-        if key in (ord('q'), ord('x')):
+        handler = self._dispatch.get(key, None)
+        if handler is None:
+            return None # FIXME: handle more keys
+        self._dirty_rows = None # handlers may narrow to specific rows
+        digests, pos = self.digests, self.win.pick_pos
+        ns = digests[pos] if 0 <= pos < len(digests) else None
+        return handler(ns)
+
+    def _update_dirty(self):
+        """ Recompute mods.dirty from the pending mods alone (O(1));
+            an edit that restores the original state clears the flag. """
+        mods = self.mods
+        mods.dirty = bool(mods.order or mods.removes or mods.tags
+                          or mods.actives or mods.inactives
+                          or mods.timeout is not None or mods.next)
+
+    def _on_enter(self, _ns):
+        """ ENTER - leave help screen if on it """
+        if self.opts.help_mode:
+            self.opts.help_mode = False
+            return True
+        return None
 
-            answer = 'y'
-            if self.mods.dirty:
-                answer = self.win.answer(
-                    prompt='Enter "y" to abandon edits and exit')
-            if answer.strip().lower().startswith('y'):
-                self.win.stop_curses()
-                os.system('clear; stty sane')
-                sys.exit(0)
-            return None
+    def _on_quit(self, _ns):
+        """ q or x - quit program """
+        answer = 'y'
+        if self.mods.dirty:
+            answer = self.win.answer(
+                prompt='Enter "y" to abandon edits and exit')
+        if answer.strip().lower().startswith('y'):
+            self.win.stop_curses()
+            self.clear_sane()
+            sys.exit(0)
+        return None
 
-        ns = self.digests[self.win.pick_pos]
-
-        if key == ord('m'):
-            if ns.ident == 'Timeout:':
-                seed = ns.label.split()[0]
-                while True:
-                    answer = self.win.answer(
-                        prompt='Enter timeout seconds or clear to abort',
-                        seed=seed, width=80)
-                    seed = answer = answer.strip()
-                    if not answer:
-                        break
-                    if re.match(r'\d+$', answer):
-                        ns.label = f'{answer} seconds'
-                        self.mods.timeout = answer
-                        self.mods.dirty = True
-                        break
-            return None
+    def _on_modify(self, ns):
+        """ m - modify the value (e.g., of Timeout:) """
+        if ns and ns is self._timeout_entry:
+            seed = ns.label.split()[0]
+            while True:
+                answer = self.win.answer(
+                    prompt='Enter timeout seconds or clear to abort',
+                    seed=seed, width=80)
+                seed = answer = answer.strip()
+                if not answer:
+                    break
+                if answer.isdigit():
+                    ns.label = f'{answer} seconds'
+                    ns.line_cache = None
+                    self._dirty_rows = {self.win.pick_pos}
+                    self.mods.timeout = answer
+                    self._update_dirty()
+                    break
+        return None
 
-        if key == ord('u') and ns.is_boot:
+    def _on_up(self, ns):
+        """ u - move boot entry up """
+        if ns and ns.is_boot:
             digests, pos = self.digests, self.win.pick_pos
             if pos > self.boot_idx:
                 digests[pos-1], digests[pos] = digests[pos], digests[pos-1]
+                bpos, idents = pos - self.boot_idx, self._boot_idents
+                idents[bpos-1], idents[bpos] = idents[bpos], idents[bpos-1]
+                self._dirty_rows = {pos-1, pos}
                 self.win.pick_pos -= 1
-                self.mods.order = True
-                self.mods.dirty = True
-            return None
-        if key == ord('d') and ns.is_boot:
+                self.mods.order = tuple(idents) != self._orig_order
+                self._update_dirty()
+        return None
+
+    def _on_down(self, ns):
+        """ d - move boot entry down """
+        if ns and ns.is_boot:
             digests, pos = self.digests, self.win.pick_pos
             if pos < len(self.digests)-1:
                 digests[pos+1], digests[pos] = digests[pos], digests[pos+1]
+                bpos, idents = pos - self.boot_idx, self._boot_idents
+                idents[bpos+1], idents[bpos] = idents[bpos], idents[bpos+1]
+                self._dirty_rows = {pos, pos+1}
                 self.win.pick_pos += 1
-                self.mods.order = True
-                self.mods.dirty = True
-            return None
-        if key == ord('r') and ns.is_boot:
-            ident = self.digests[self.win.pick_pos].ident
-            del self.digests[self.win.pick_pos]
-            self.mods.removes.add(ident)
-            self.mods.actives.discard(ident)
-            self.mods.inactives.discard(ident)
-            self.mods.dirty = True
-            return None
-        if key == ord('n') and ns.is_boot:
+                self.mods.order = tuple(idents) != self._orig_order
+                self._update_dirty()
+        return None
+
+    def _on_remove(self, ns):
+        """ r - remove boot entry """
+        if ns and ns.is_boot:
+            ident, pos = ns.ident, self.win.pick_pos
+            del self.digests[pos]
+            del self._boot_idents[pos - self.boot_idx]
+            mods = self.mods
+            mods.removes.add(ident)
+            mods.actives.discard(ident)
+            mods.inactives.discard(ident)
+            self._update_dirty()
+        return None
+
+    def _on_next(self, ns):
+        """ n - set next boot default """
+        if ns and ns.is_boot:
             ident = ns.ident
-            self.digests[0].label = ident
+            self._bootnext_entry.label = ident
+            self._bootnext_entry.line_cache = None
+            self._dirty_rows = {0}
             self.mods.next = ident
-            self.mods.dirty = True
-            return None
+            self._update_dirty()
+        return None
 
-        if key == ord('*') and ns.is_boot:
-            ident = ns.ident
+    def _on_toggle(self, ns):
+        """ * - toggle whether entry is active """
+        if ns and ns.is_boot:
+            ident, mods = ns.ident, self.mods
+            was_active = ident in self._orig_actives
             if ns.active:
                 ns.active = ''
-                self.mods.actives.discard(ident)
-                self.mods.inactives.add(ident)
+                mods.actives.discard(ident)
+                # only a real change (vs the as-read state) is a mod, so
+                # toggling twice leaves nothing pending
+                if was_active:
+                    mods.inactives.add(ident)
             else:
                 ns.active = '*'
-                self.mods.actives.add(ident)
-                self.mods.inactives.discard(ident)
-            self.mods.dirty = True
+                mods.inactives.discard(ident)
+                if not was_active:
+                    mods.actives.add(ident)
+            ns.line_cache = None
+            self._dirty_rows = {self.win.pick_pos}
+            self._update_dirty()
+        return None
 
-        if key == ord('t') and ns.is_boot:
+    def _on_tag(self, ns):
+        """ t - set a new label for the boot entry """
+        if ns and ns.is_boot:
             seed = ns.label
             while True:
                 answer = self.win.answer(prompt='Type new label or clear to abort',
@@ -480,37 +744,48 @@ class EfiBootDude:
                 seed = answer = answer.strip()
                 if not answer:
                     break
-                if re.match(r'([\w\s])+$', answer):
+                if all(ch.isalnum() or ch == '_' or ch.isspace()
+                        for ch in answer):
                     ns.label = f'{answer}'
+                    ns.line_cache = None
+                    self._dirty_rows = {self.win.pick_pos}
+                    if len(answer) > self.label_wid:
+                        # widen the column in place; the new label_wid in
+                        # the cache key re-formats every row lazily
+                        self.label_wid = len(answer)
+                        self._dirty_rows = None # every row shifts
                     self.mods.tags[ns.ident] = answer
-                    self.mods.dirty = True
+                    self._update_dirty()
                     break
+        return None
 
-        if key == 27:  # ESC
-            if self.mods.dirty:
-                answer = self.win.answer(
-                    prompt='Type "y" to clear edits and refresh')
-                if answer.strip().lower().startswith('y'):
-                    self.reinit()
-            else:
+    def _on_esc(self, _ns):
+        """ ESC - abandon changes and re-read boot state """
+        if self.mods.dirty:
+            answer = self.win.answer(
+                prompt='Type "y" to clear edits and refresh')
+            if answer.strip().lower().startswith('y'):
                 self.reinit()
-            return None
+        else:
+            self.reinit()
+        return None
 
-        if key == ord('w') and self.mods.dirty:
+    def _on_write(self, _ns):
+        """ w - write the changes """
+        if self.mods.dirty:
             self.write()
+        return None
+
+    def _on_boot(self, _ns):
+        """ b - reboot the machine """
+        if self.mods.dirty:
+            self.win.alert('Pending changes (on return, use "w" to commit or "ESC" to discard)')
             return None
 
-        if key == ord('b'):
-            if self.mods.dirty:
-                self.win.alert('Pending changes (on return, use "w" to commit or "ESC" to discard)')
-                return
-            
-            answer = self.win.answer(prompt='Type "reboot" to reboot',
-                    seed='reboot', width=80)
-            if answer.strip().lower().startswith('reboot'):
-                self.reboot()
-
-        # FIXME: handle more keys
+        answer = self.win.answer(prompt='Type "reboot" to reboot',
+                seed='reboot', width=80)
+        if answer.strip().lower().startswith('reboot'):
+            self.reboot()
         return None
 
 